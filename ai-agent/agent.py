@@ -1,14 +1,206 @@
-import os, json, subprocess
-from analyzers import detect_languages_and_tools, run_analyzers
-from llm import call_llm
-from github import Github, Auth
-from openai import OpenAI
+import os, re, shutil, subprocess
+import orjson
+from typing import Literal
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from analyzers import analyzer_failed, detect_languages_and_tools, run_analyzers
+from llm import call_llm, model_id
+from llm_cache import cached_call
+from pydantic import BaseModel
+
+GUARDIAN_MODEL = "gpt-4.1-mini"
+ANALYSIS_CACHE_DIR = os.path.join("analysis_results", ".cache")
+PROMPT_OUTPUT_LIMIT = 1500
+MAX_REPORT_PARSE_BYTES = 16 * 1024 * 1024
+MAX_DIFF_BYTES = 32_768
+DIFF_TRUNCATED_MARKER = "\n…<truncated>…"
+GIT_SHA = re.compile(r"[0-9a-f]{40,64}")
+# Added/removed lines of a unified diff, excluding the ---/+++ file headers
+DIFF_CHANGED_LINE = re.compile(r"^(?!--- (?:a/|/dev/null)|\+\+\+ (?:b/|/dev/null))[+-]", re.MULTILINE)
+# Extended headers for changes that carry no +/- lines: binaries, modes, renames, copies, empty files
+DIFF_META_CHANGE = re.compile(
+    r"^(?:Binary files |GIT binary patch|(?:old|new|new file|deleted file) mode |rename from |copy from )",
+    re.MULTILINE,
+)
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def copy_atomic(src, path):
+    # copyfile uses the kernel's copy fast path, so tool output never enters the Python heap
+    tmp_path = f"{path}.tmp"
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, path)
+
+def write_analyzer_results(analyzer_results, out_dir):
+    # Tool output is copied file-to-file; only the small index passes through the JSON encoder
+    raw_dir = os.path.join(out_dir, "raw")
+    os.makedirs(raw_dir, exist_ok=True)
+    index = {}
+    for tool, data in analyzer_results.items():
+        if "error" in data:
+            index[tool] = {"error": data["error"]}
+            continue
+        entry = {"returncode": data["returncode"]}
+        for stream in ("stdout", "stderr"):
+            name = f"{tool}.{stream}"
+            copy_atomic(data[f"{stream}_path"], os.path.join(raw_dir, name))
+            entry[stream] = f"raw/{name}"
+        index[tool] = entry
+    write_atomic(os.path.join(out_dir, "analyzer_results.json"), orjson.dumps(index, option=orjson.OPT_INDENT_2))
+
+def read_analyzer_results(out_dir):
+    with open(os.path.join(out_dir, "analyzer_results.json"), "rb") as f:
+        index = orjson.loads(f.read())
+    analyzer_results = {}
+    for tool, entry in index.items():
+        if "error" in entry:
+            analyzer_results[tool] = entry
+            continue
+        data = {"returncode": entry["returncode"]}
+        for stream in ("stdout", "stderr"):
+            data[f"{stream}_path"] = os.path.join(out_dir, entry[stream])
+        analyzer_results[tool] = data
+    return analyzer_results
+
+def analysis_cache_path(repo_root, run_semgrep):
+    # Only a clean checkout is fully described by its HEAD sha
+    try:
+        head = run_git(repo_root, "rev-parse", "HEAD")
+        dirty = run_git(repo_root, "status", "--porcelain", "--untracked-files=no")
+    except subprocess.CalledProcessError:
+        return None
+    if not GIT_SHA.fullmatch(head) or dirty:
+        return None
+    suffix = "semgrep" if run_semgrep else "nosemgrep"
+    return os.path.join(ANALYSIS_CACHE_DIR, f"{head}-{suffix}")
+
+def prune_analysis_cache(head):
+    # Entries for other commits would ride along in every saved Actions cache, growing it without bound.
+    # Everything for this commit stays: both semgrep flags and any entry still being written
+    if not os.path.isdir(ANALYSIS_CACHE_DIR):
+        return
+    with os.scandir(ANALYSIS_CACHE_DIR) as entries:
+        stale = [entry.path for entry in entries if not entry.name.startswith(f"{head}-")]
+    for path in stale:
+        shutil.rmtree(path, ignore_errors=True)
+
+def collect_analysis(repo_root, run_semgrep, max_workers=None):
+    cache_path = analysis_cache_path(repo_root, run_semgrep)
+    if cache_path:
+        prune_analysis_cache(os.path.basename(cache_path).split("-")[0])
+    if cache_path and os.path.isdir(cache_path):
+        with open(os.path.join(cache_path, "detected.json"), "rb") as f:
+            detected = orjson.loads(f.read())
+        return detected, read_analyzer_results(cache_path)
 
-def run_universal_agent(repo_root, llm_provider, run_semgrep):
     detected = detect_languages_and_tools(repo_root)
-    analyzer_results = run_analyzers(repo_root, detected, run_semgrep)
+    analyzer_results = run_analyzers(repo_root, detected, run_semgrep, max_workers)
+
+    # Don't pin a run where an analyzer failed (e.g. semgrep couldn't fetch its rules); a re-run retries it
+    if cache_path and not any(analyzer_failed(tool, r) for tool, r in analyzer_results.items()):
+        tmp_path = f"{cache_path}.tmp{os.getpid()}"
+        write_analyzer_results(analyzer_results, tmp_path)
+        with open(os.path.join(tmp_path, "detected.json"), "wb") as f:
+            f.write(orjson.dumps(detected))
+        try:
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # Another run published the same entry first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    return detected, analyzer_results
+
+def run_universal_agent(repo_root, llm_provider, run_semgrep, max_workers=None):
+    detected, analyzer_results = collect_analysis(repo_root, run_semgrep, max_workers)
     prompt = build_prompt(detected, analyzer_results)
-    return call_llm(provider=llm_provider, prompt=prompt), analyzer_results
+    llm_response = cached_call(model_id(llm_provider), prompt, 0, lambda: call_llm(provider=llm_provider, prompt=prompt))
+    return llm_response, analyzer_results
+
+def truncate_utf8(data, limit):
+    # Slice before decoding so huge outputs are never decoded in full; back off
+    # continuation bytes (0b10xxxxxx) so the cut never splits a character
+    if len(data) <= limit:
+        return data.decode("utf-8", "replace")
+    end = limit
+    while end > 0 and (data[end] & 0xC0) == 0x80:
+        end -= 1
+    return data[:end].decode("utf-8", "replace")
+
+def read_head(path, limit):
+    # One byte past the limit tells truncate_utf8 whether there is more
+    with open(path, "rb") as f:
+        return f.read(limit + 1)
+
+def checkov_failed_checks(report):
+    # checkov prints one report per framework, or a bare object when only one framework ran
+    reports = report if isinstance(report, list) else [report]
+    return [check for r in reports for check in r["results"]["failed_checks"]]
+
+# Flattens each JSON analyzer's report to one record per finding. Metadata such as bandit's
+# metrics sorts ahead of the findings and would otherwise use up the whole prompt budget
+FINDINGS = {
+    "bandit": lambda report: report["results"],
+    "semgrep": lambda report: report["results"],
+    "tfsec": lambda report: report["results"],
+    "checkov": checkov_failed_checks,
+    "trivy": lambda report: [
+        {"Target": r["Target"], **m} for r in report.get("Results") or [] for m in r.get("Misconfigurations") or []
+    ],
+    "kube-linter": lambda report: report["Reports"],
+    "javascript": lambda report: [{"filePath": f["filePath"], **m} for f in report for m in f["messages"]],
+    "rubocop": lambda report: [{"path": f["path"], **o} for f in report["files"] for o in f["offenses"]],
+    "pmd": lambda report: [{"filename": f["filename"], **v} for f in report["files"] for v in f["violations"]],
+    "phpcs": lambda report: [{"file": path, **m} for path, f in report["files"].items() for m in f["messages"]],
+    "psalm": lambda report: report,
+}
+# Fields that are large and add nothing to a review: code snippets, long descriptions,
+# reference links, autofix payloads and rule metadata
+BULKY_FINDING_KEYS = {
+    "code", "Code", "code_block", "lines", "snippet", "selected_text",
+    "Description", "References", "links", "more_info", "externalInfoUrl",
+    "fix", "suggestions", "metadata", "fingerprint", "line_range",
+}
+
+def slim_finding(value):
+    # Nested too, e.g. semgrep's extra.lines and trivy's CauseMetadata.Code
+    if isinstance(value, dict):
+        return {k: slim_finding(v) for k, v in value.items() if k not in BULKY_FINDING_KEYS}
+    if isinstance(value, list):
+        return [slim_finding(v) for v in value]
+    return value
+
+def extract_findings(tool, stdout_path):
+    # None means the output isn't a report we understand; the caller falls back to its raw head
+    extract = FINDINGS.get(tool)
+    if extract is None or os.path.getsize(stdout_path) > MAX_REPORT_PARSE_BYTES:
+        return None
+    try:
+        with open(stdout_path, "rb") as f:
+            findings = extract(orjson.loads(f.read()))
+    except (orjson.JSONDecodeError, KeyError, TypeError, AttributeError):
+        return None
+    return [slim_finding(f) for f in findings] if isinstance(findings, list) else None
+
+def compact_results(analyzer_results, limit=PROMPT_OUTPUT_LIMIT):
+    # The prompt only needs each tool's findings, capped; the full dump is saved as an artifact
+    compact = {}
+    for tool, data in analyzer_results.items():
+        if "error" in data:
+            compact[tool] = {"error": data["error"]}
+            continue
+        entry = {"returncode": data.get("returncode")}
+        findings = extract_findings(tool, data["stdout_path"])
+        if findings is None:
+            entry["stdout"] = truncate_utf8(read_head(data["stdout_path"], limit), limit)
+        else:
+            entry["finding_count"] = len(findings)
+            entry["findings"] = truncate_utf8(orjson.dumps(findings), limit)
+        entry["stderr"] = truncate_utf8(read_head(data["stderr_path"], limit), limit)
+        compact[tool] = entry
+    return compact
 
 def build_prompt(detected, analyzer_results):
     return (
@@ -16,20 +208,106 @@ def build_prompt(detected, analyzer_results):
         "1) A short summary of the repo health.\n"
         "2) A prioritized list of all actionable items.\n"
         "3) Line-level suggestions if available.\n"
-        f"Repository analysis data:\n{json.dumps(analyzer_results, indent=2)}"
+        f"Repository analysis data (findings or raw output truncated to {PROMPT_OUTPUT_LIMIT} bytes per tool):\n"
+        f"{orjson.dumps(compact_results(analyzer_results)).decode()}"
     )
 
-def run_genops_guardian(repo_root, mode):
-    api_key = os.getenv("OPENAI_API_KEY")
+def run_git(repo_root, *args):
+    # Exec git directly instead of going through /bin/sh, saving a process per call. Output is
+    # captured as bytes and decoded once as UTF-8, so non-UTF-8 diffs can't break the locale codec
+    result = subprocess.run(["git", "-C", repo_root, *args], capture_output=True, check=True)
+    return result.stdout.decode("utf-8", "replace").strip()
 
-    client = OpenAI(api_key=api_key)
+def read_git_diff(repo_root, limit=MAX_DIFF_BYTES):
+    # Read at most limit bytes and stop git, so a huge merge can't blow up memory or the prompt
+    proc = subprocess.Popen(
+        ["git", "-C", repo_root, "diff", "--no-color", "--stat", "--patch", "-U1", "HEAD~5", "HEAD"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    data = proc.stdout.read(limit + 1)
+    truncated = len(data) > limit
+    if truncated:
+        proc.terminate()
+    proc.stdout.close()
+    stderr = proc.stderr.read()
+    proc.stderr.close()
+    # A git we stopped exits non-zero too; only a failure on its own means there is no diff
+    if proc.wait() != 0 and not truncated:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args, stderr=stderr)
+    git_diff = truncate_utf8(data, limit).strip()
+    return f"{git_diff}{DIFF_TRUNCATED_MARKER}" if truncated else git_diff
+
+def is_trivial_diff(git_diff):
+    # The unseen remainder of a truncated diff may hold real changes
+    if git_diff.endswith(DIFF_TRUNCATED_MARKER):
+        return False
+    # Any changed line matters to a risk review, including indentation and reordering
+    return not DIFF_CHANGED_LINE.search(git_diff) and not DIFF_META_CHANGE.search(git_diff)
 
+# Returns (context, None), or (None, report) when the guardian can answer without an LLM call
+def collect_guardian_context(repo_root, mode):
     if mode == "demo":
-        context = "This is a simulated CI/CD pipeline log."
-    else:
-        git_log = subprocess.getoutput(f"git -C {repo_root} log -n 5 --pretty=oneline")
-        git_diff = subprocess.getoutput(f"git -C {repo_root} diff HEAD~5 HEAD")
-        context = f"### Commits\n{git_log}\n\n### Diff\n{git_diff}"
+        return "This is a simulated CI/CD pipeline log.", None
+    try:
+        git_diff = read_git_diff(repo_root)
+        if is_trivial_diff(git_diff):
+            return None, trivial_diff_report()
+        git_log = run_git(repo_root, "log", "-n", "5", "--pretty=oneline")
+    except subprocess.CalledProcessError as e:
+        return None, diff_unavailable_report(e)
+    return f"### Commits\n{git_log}\n\n### Diff\n{git_diff}", None
+
+def trivial_diff_report():
+    return {"risk_score": 0, "risk_level": "Low", "issues": [],
+            "analysis_text": "No code changes in the last 5 commits; risk analysis skipped."}
+
+def diff_unavailable_report(error):
+    # Unreviewed changes are unknown risk, never a clean bill of health
+    stderr = (error.stderr or b"").decode("utf-8", "replace").strip()
+    reason = stderr.splitlines()[0] if stderr else f"exit code {error.returncode}"
+    return {"risk_score": 50, "risk_level": "Medium",
+            "issues": [f"Could not read the last 5 commits from git: {reason}"],
+            "analysis_text": "The changes could not be collected, so they were not reviewed; risk analysis skipped."}
+
+class GuardianReport(BaseModel):
+    risk_score: int
+    risk_level: Literal["Low", "Medium", "High"]
+    issues: list[str]
+    analysis_text: str
+
+class UniversalReport(BaseModel):
+    summary: str
+    full: str
+
+class CombinedReport(BaseModel):
+    universal: UniversalReport
+    guardian: GuardianReport
+
+def unstructured_guardian_report(output_text):
+    return {"risk_score": 50, "risk_level": "Medium", "issues": ["Unstructured output"], "analysis_text": output_text}
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    # One client per process keeps its httpx pool, and the TLS session, warm across requests.
+    # The SDK is imported here so runs whose diff is trivial never load it
+    from openai import OpenAI
+
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def request_structured(client, prompt, schema):
+    # Structured outputs constrain decoding to the schema, so a completed call is always valid JSON
+    def request():
+        response = client.responses.parse(model=GUARDIAN_MODEL, input=prompt, temperature=0, text_format=schema)
+        if response.output_parsed is None:
+            # Refusal or truncated output; reported as an error so it isn't cached
+            return {"error": response.output_text}
+        return response.output_parsed.model_dump()
+    return cached_call(f"{GUARDIAN_MODEL}:{schema.__name__}", prompt, 0, request)
+
+def run_genops_guardian(repo_root, mode):
+    context, report = collect_guardian_context(repo_root, mode)
+    if report is not None:
+        return report
 
     prompt = f"""
     You are GenOps Guardian — an AI DevOps assistant.
@@ -42,37 +320,97 @@ def run_genops_guardian(repo_root, mode):
     {context}
     """
 
-    response = client.responses.create(model="gpt-4.1-mini", input=prompt, temperature=0)
-    try:
-        return json.loads(response.output_text.strip())
-    except Exception:
-        return {"risk_score": 50, "risk_level": "Medium", "issues": ["Unstructured output"], "analysis_text": response.output_text}
+    report = request_structured(get_openai_client(), prompt, GuardianReport)
+    if "error" in report:
+        return unstructured_guardian_report(report["error"])
+    return report
+
+def build_combined_prompt(analyzer_results, context):
+    return (
+        "You are an expert engineering reviewer and GenOps Guardian — an AI DevOps assistant.\n"
+        "Review both sections below and output a single JSON object with two keys:\n"
+        "- universal: {summary, full} where summary is a short summary of the repo health and full is "
+        "a prioritized list of all actionable items with line-level suggestions if available\n"
+        "- guardian: {risk_score (0-100), risk_level (Low/Medium/High), issues (list), "
+        "analysis_text (short explanation)} for the pipeline context\n"
+        f"### Repository analysis data (findings or raw output truncated to {PROMPT_OUTPUT_LIMIT} bytes per tool)\n"
+        f"{orjson.dumps(compact_results(analyzer_results)).decode()}\n\n"
+        f"### Pipeline context\n{context}"
+    )
+
+def run_combined_review(repo_root, run_semgrep, mode, max_workers=None):
+    # Gather both inputs concurrently, then answer both reviewers with a single request
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        analysis = ex.submit(collect_analysis, repo_root, run_semgrep, max_workers)
+        context = ex.submit(collect_guardian_context, repo_root, mode)
+        detected, analyzer_results = analysis.result()
+        guardian_context, guardian_report = context.result()
+
+    if guardian_report is not None:
+        # Nothing for the guardian to review; only the universal agent needs the LLM
+        prompt = build_prompt(detected, analyzer_results)
+        llm_response = cached_call(model_id("openai"), prompt, 0, lambda: call_llm(provider="openai", prompt=prompt))
+        return llm_response, analyzer_results, guardian_report
+
+    prompt = build_combined_prompt(analyzer_results, guardian_context)
+    report = request_structured(get_openai_client(), prompt, CombinedReport)
+    if "error" in report:
+        return {"full": report["error"]}, analyzer_results, unstructured_guardian_report(report["error"])
+    return report["universal"], analyzer_results, report["guardian"]
+
+@lru_cache(maxsize=4)
+def get_repo(token, repo_name):
+    # PyGithub is only needed when posting to a PR, so real-mode runs skip its import cost
+    from github import Github, Auth
+
+    gh = Github(auth=Auth.Token(token))
+    return gh.get_repo(repo_name)
+
+@lru_cache(maxsize=None)
+def get_pull(token, repo_name, pr_number):
+    return get_repo(token, repo_name).get_pull(int(pr_number))
 
 def post_comment(pr_number, body):
     token = os.getenv("GITHUB_TOKEN")
     repo_name = os.getenv("GITHUB_REPOSITORY")
 
-    gh = Github(auth=Auth.Token(token))
-    repo = gh.get_repo(repo_name)
-    pr = repo.get_pull(int(pr_number))
-    pr.create_issue_comment(body)
+    get_pull(token, repo_name, pr_number).create_issue_comment(body)
+
+def parse_max_workers(value):
+    # Unset workflow inputs arrive as empty strings; 0 keeps the per-core default
+    value = value.strip() or "0"
+    try:
+        max_workers = int(value)
+    except ValueError:
+        raise SystemExit(f"INPUT_MAX_WORKERS must be a non-negative integer, got {value!r}")
+    if max_workers < 0:
+        raise SystemExit(f"INPUT_MAX_WORKERS must be a non-negative integer, got {max_workers}")
+    return max_workers or None
 
 def run_agent():
     repo_root = os.getenv("GITHUB_WORKSPACE", os.getcwd())
     llm_provider = os.getenv("INPUT_LLM_PROVIDER", "openai")
     run_semgrep = os.getenv("INPUT_RUN_SEMGREP", "true").lower() == "true"
+    max_workers = parse_max_workers(os.getenv("INPUT_MAX_WORKERS", ""))
     mode = "pr" if os.getenv("GITHUB_EVENT_NAME") == "pull_request" else "real"
     pr_number = os.getenv("PR_NUMBER")
 
-    # Universal Agent
-    llm_response, analyzer_results = run_universal_agent(repo_root, llm_provider, run_semgrep)
+    if llm_provider == "openai":
+        # One OpenAI request serves both the Universal Agent and GenOps Guardian
+        llm_response, analyzer_results, genops_data = run_combined_review(repo_root, run_semgrep, mode, max_workers)
+    else:
+        # Universal Agent and GenOps Guardian are independent and I/O-bound, so run them side by side
+        with ThreadPoolExecutor(max_workers=2) as ex:
+            universal = ex.submit(run_universal_agent, repo_root, llm_provider, run_semgrep, max_workers)
+            guardian = ex.submit(run_genops_guardian, repo_root, mode)
+            llm_response, analyzer_results = universal.result()
+            genops_data = guardian.result()
+
     ua_comment = (
         f"### Repository Health Summary\n{llm_response.get('summary','')}\n\n---\n\n"
-        f"### Detailed Report\n{llm_response.get('full', json.dumps(analyzer_results, indent=2))}"
+        f"### Detailed Report\n{llm_response.get('full', orjson.dumps(compact_results(analyzer_results), option=orjson.OPT_INDENT_2).decode())}"
     )
 
-    # GenOps Guardian
-    genops_data = run_genops_guardian(repo_root, mode)
     guardian_comment = (
         f"**Risk Score:** {genops_data['risk_score']} ({genops_data['risk_level']})\n\n"
         f"**Detected Issues:**\n" + "\n".join(f"- {i}" for i in genops_data.get("issues", [])) +
@@ -80,16 +418,14 @@ def run_agent():
     )
 
     if pr_number:
-        # Post comments in PR mode
-        post_comment(pr_number, ua_comment)
-        post_comment(pr_number, guardian_comment)
+        # Post both reviews as a single comment in PR mode
+        post_comment(pr_number, f"{ua_comment}\n\n---\n\n{guardian_comment}")
     else:
         # Save reports in real mode
         os.makedirs("analysis_results", exist_ok=True)
-        with open("analysis_results/universal_agent.txt", "w", encoding="utf-8") as f:
-            f.write(ua_comment)
-        with open("analysis_results/genops_guardian.json", "w", encoding="utf-8") as f:
-            json.dump(genops_data, f, indent=2)
+        write_atomic("analysis_results/universal_agent.txt", ua_comment.encode("utf-8"))
+        write_atomic("analysis_results/genops_guardian.json", orjson.dumps(genops_data, option=orjson.OPT_INDENT_2))
+        write_analyzer_results(analyzer_results, "analysis_results")
         print(" Reports written to analysis_results/ for inspection.")
 
 if __name__ == "__main__":
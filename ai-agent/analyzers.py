@@ -1,109 +1,171 @@
 import os
-import subprocess
+import atexit
+import shutil
+import asyncio
+import tempfile
+
+# Exit codes an analyzer uses when it ran and reported findings; anything else is a tool failure
+FINDINGS_EXIT_CODES = {
+    'python': {0, 1},
+    'bandit': {0, 1},
+    'javascript': {0, 1},
+    'semgrep': {0, 1},
+    'checkov': {0, 1},
+    'tfsec': {0, 1},
+    'kube-linter': {0, 1},
+    'rubocop': {0, 1},
+    'govet': {0, 1},
+    'staticcheck': {0, 1},
+    'pmd': {0, 4},
+    'phpcs': {0, 1, 2},
+    'psalm': {0, 2},
+    'roslyn': {0, 1},
+}
+# Tools whose exit code is their finding count; they ran if they wrote a report
+COUNTING_EXIT_CODE_TOOLS = {'checkstyle'}
 
 def detect_languages_and_tools(repo_root):
     detected = {'languages': [], 'tools': []}
-    files = os.listdir(repo_root)
+
+    # One directory read; every check below is an in-memory lookup instead of a stat call
+    names = set()
+    has_csproj = has_tf = has_yaml = False
+    with os.scandir(repo_root) as entries:
+        for entry in entries:
+            name = entry.name
+            names.add(name)
+            if name.endswith('.csproj'):
+                has_csproj = True
+            elif name.endswith('.tf'):
+                has_tf = True
+            elif name.endswith(('.yaml', '.yml')):
+                has_yaml = True
 
     # Python
-    if os.path.exists(os.path.join(repo_root, 'requirements.txt')) or os.path.exists(os.path.join(repo_root, 'pyproject.toml')):
+    if 'requirements.txt' in names or 'pyproject.toml' in names:
         detected['languages'].append('python')
 
     # JavaScript / Node
-    if os.path.exists(os.path.join(repo_root, 'package.json')):
+    if 'package.json' in names:
         detected['languages'].append('javascript')
         detected['tools'].append('npm')
 
     # Java
-    if os.path.exists(os.path.join(repo_root, 'pom.xml')) or os.path.exists(os.path.join(repo_root, 'build.gradle')):
+    if 'pom.xml' in names or 'build.gradle' in names:
         detected['languages'].append('java')
 
     # Go
-    if os.path.exists(os.path.join(repo_root, 'go.mod')):
+    if 'go.mod' in names:
         detected['languages'].append('go')
 
     # Ruby
-    if os.path.exists(os.path.join(repo_root, 'Gemfile')):
+    if 'Gemfile' in names:
         detected['languages'].append('ruby')
 
     # PHP
-    if os.path.exists(os.path.join(repo_root, 'composer.json')):
+    if 'composer.json' in names:
         detected['languages'].append('php')
 
     # .NET / C#
-    if any(f.endswith('.csproj') for f in files):
+    if has_csproj:
         detected['languages'].append('dotnet')
 
     # Docker
-    if os.path.exists(os.path.join(repo_root, 'Dockerfile')):
+    if 'Dockerfile' in names:
         detected['tools'].append('dockerfile')
 
     # Terraform / Kubernetes
-    if any(f.endswith('.tf') for f in files):
+    if has_tf:
         detected['tools'].append('terraform')
-    if any(f.endswith(('.yaml', '.yml')) for f in files):
+    if has_yaml:
         detected['tools'].append('k8s')
 
     return detected
 
-def run_analyzers(repo_root, detected, run_semgrep):
-    results = {}
+def run_analyzers(repo_root, detected, run_semgrep, max_workers=None):
+    return asyncio.run(run_analyzers_async(repo_root, detected, run_semgrep, max_workers))
+
+async def run_analyzers_async(repo_root, detected, run_semgrep, max_workers=None):
+    jobs = {}
 
     # Python
     if 'python' in detected['languages']:
-        results['python'] = run_command(['ruff', '.'], repo_root) or run_command(['pylint', '-f', 'json', '.'], repo_root)
-        results['bandit'] = run_command(['bandit', '-r', '.', '-f', 'json'], repo_root)
+        jobs['python'] = ['ruff', '.']
+        jobs['bandit'] = ['bandit', '-r', '.', '-f', 'json']
 
     # JavaScript
     if 'javascript' in detected['languages']:
-        results['javascript'] = run_command(['npx', 'eslint', '.', '-f', 'json'], repo_root)
+        jobs['javascript'] = ['npx', 'eslint', '.', '-f', 'json']
 
     # Java
     if 'java' in detected['languages']:
-        results['spotbugs'] = run_command(['spotbugs', '-textui', '-xml', 'target/classes'], repo_root)
-        results['pmd'] = run_command(['pmd', 'check', '-d', 'src', '-R', 'rulesets/java/quickstart.xml', '-f', 'json'], repo_root)
-        results['checkstyle'] = run_command(['java', '-jar', '/opt/checkstyle/checkstyle.jar', '-c', '/opt/checkstyle/google_checks.xml', 'src'], repo_root)
+        jobs['spotbugs'] = ['spotbugs', '-textui', '-xml', 'target/classes']
+        jobs['pmd'] = ['pmd', 'check', '-d', 'src', '-R', 'rulesets/java/quickstart.xml', '-f', 'json']
+        jobs['checkstyle'] = ['java', '-jar', '/opt/checkstyle/checkstyle.jar', '-c', '/opt/checkstyle/google_checks.xml', 'src']
 
     # Go
     if 'go' in detected['languages']:
-        results['govet'] = run_command(['go', 'vet', './...'], repo_root)
-        results['staticcheck'] = run_command(['staticcheck', './...'], repo_root)
+        jobs['govet'] = ['go', 'vet', './...']
+        jobs['staticcheck'] = ['staticcheck', './...']
 
     # Ruby
     if 'ruby' in detected['languages']:
-        results['rubocop'] = run_command(['rubocop', '-f', 'json'], repo_root)
+        jobs['rubocop'] = ['rubocop', '-f', 'json']
 
     # PHP
     if 'php' in detected['languages']:
-        results['phpcs'] = run_command(['phpcs', '--report=json'], repo_root)
-        results['psalm'] = run_command(['psalm', '--output-format=json'], repo_root)
+        jobs['phpcs'] = ['phpcs', '--report=json']
+        jobs['psalm'] = ['psalm', '--output-format=json']
 
     # .NET / C#
     if 'dotnet' in detected['languages']:
-        results['roslyn'] = run_command(['dotnet', 'build', '/warnaserror'], repo_root)
+        jobs['roslyn'] = ['dotnet', 'build', '/warnaserror']
 
     # Docker
     if 'dockerfile' in detected['tools']:
-        results['trivy'] = run_command(['trivy', 'config', '--format', 'json', repo_root], repo_root)
+        jobs['trivy'] = ['trivy', 'config', '--format', 'json', repo_root]
 
     # Terraform
     if 'terraform' in detected['tools']:
-        results['checkov'] = run_command(['checkov', '-d', repo_root, '-o', 'json'], repo_root)
-        results['tfsec'] = run_command(['tfsec', '--format', 'json', repo_root], repo_root)
+        jobs['checkov'] = ['checkov', '-d', repo_root, '-o', 'json']
+        jobs['tfsec'] = ['tfsec', '--format', 'json', repo_root]
 
     # Kubernetes YAML
     if 'k8s' in detected['tools']:
-        results['kube-linter'] = run_command(['kube-linter', 'lint', repo_root, '--output', 'json'], repo_root)
+        jobs['kube-linter'] = ['kube-linter', 'lint', repo_root, '--output', 'json']
 
     # Semgrep (all languages)
     if run_semgrep:
-        results['semgrep'] = run_command(['semgrep', '--config', 'auto', '--json', '--quiet'], repo_root)
+        jobs['semgrep'] = ['semgrep', '--config', 'auto', '--json', '--quiet']
+
+    # Tool output is spooled to disk so multi-MB reports never sit in memory
+    spool_dir = tempfile.mkdtemp(prefix='genops-analyzers-')
+    atexit.register(shutil.rmtree, spool_dir, ignore_errors=True)
+
+    # Analyzers are independent processes, so run them side by side, bounded by the core count
+    semaphore = asyncio.Semaphore(max_workers or os.cpu_count() or 4)
+
+    async def run_job(key, cmd):
+        async with semaphore:
+            return await run_command(cmd, repo_root, os.path.join(spool_dir, key))
+
+    results = await asyncio.gather(*(run_job(key, cmd) for key, cmd in jobs.items()))
+    return dict(zip(jobs, results))
 
-    return results
+def analyzer_failed(tool, result):
+    if 'error' in result:
+        return True
+    if tool in COUNTING_EXIT_CODE_TOOLS:
+        return result['returncode'] < 0 or os.path.getsize(result['stdout_path']) == 0
+    return result['returncode'] not in FINDINGS_EXIT_CODES.get(tool, {0})
 
-def run_command(cmd, cwd):
+async def run_command(cmd, cwd, output_prefix):
+    stdout_path = f'{output_prefix}.stdout'
+    stderr_path = f'{output_prefix}.stderr'
     try:
-        result = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, check=False)
-        return {'stdout': result.stdout, 'stderr': result.stderr, 'returncode': result.returncode}
+        with open(stdout_path, 'wb') as out, open(stderr_path, 'wb') as err:
+            proc = await asyncio.create_subprocess_exec(*cmd, cwd=cwd, stdout=out, stderr=err)
+            returncode = await proc.wait()
+        return {'stdout_path': stdout_path, 'stderr_path': stderr_path, 'returncode': returncode}
     except Exception as e:
         return {'error': str(e)}
@@ -1,19 +1,55 @@
 #Author: Sourav Chandra
 import os
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# One pooled session keeps TCP/TLS connections alive between LLM calls. Connect errors and
+# 429/5xx answers are retried; read timeouts are not, since the completion may still be billed
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, read=0, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=None),
+)
+_SESSION.mount('https://', _ADAPTER)
+_SESSION.mount('http://', _ADAPTER)
+_TIMEOUT = (5, 60)
+OPENAI_MODEL = 'gpt-4.1-mini'
+
+def model_id(provider):
+    # Identifies who actually answers, so a new model or endpoint never replays another's cached response
+    if provider == 'openai':
+        return f'openai:{OPENAI_MODEL}'
+    if provider == 'custom':
+        return f"custom:{os.getenv('CUSTOM_LLM_ENDPOINT', '')}"
+    return provider
 
 def call_llm(provider, prompt):
+    try:
+        return _call_llm(provider, prompt)
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+        return {'error': f'{provider} request failed: {e}'}
+
+def _call_llm(provider, prompt):
     if provider == 'openai':
         key = os.getenv('OPENAI_API_KEY')
         if not key:
             return {'error': 'OPENAI_API_KEY missing'}
-        response = requests.post(
+        response = _SESSION.post(
             'https://api.openai.com/v1/chat/completions',
             headers={'Authorization': f'Bearer {key}', 'Content-Type': 'application/json'},
-            json={'model': 'gpt-4.1-mini', 'messages': [{'role': 'user', 'content': prompt}], 'max_tokens': 1200}
+            json={'model': OPENAI_MODEL, 'messages': [{'role': 'user', 'content': prompt}], 'max_tokens': 1200, 'temperature': 0},
+            timeout=_TIMEOUT
         )
-        data = response.json()
-        text = data.get('choices', [{}])[0].get('message', {}).get('content', '')
+        if response.status_code >= 400:
+            return {'error': f'openai returned HTTP {response.status_code}: {response.text[:500]}'}
+        data = orjson.loads(response.content)
+        choices = data.get('choices')
+        if not choices:
+            return {'error': f'openai response has no choices: {response.text[:500]}'}
+        text = choices[0].get('message', {}).get('content') or ''
         return {'summary': '\n'.join(text.splitlines()[:8]), 'full': text}
 
     if provider == 'bedrock':
@@ -23,8 +59,10 @@ def call_llm(provider, prompt):
         url = os.getenv('CUSTOM_LLM_ENDPOINT')
         if not url:
             return {'error': 'CUSTOM_LLM_ENDPOINT missing'}
-        response = requests.post(url, json={'prompt': prompt})
-        data = response.json()
+        response = _SESSION.post(url, json={'prompt': prompt}, timeout=_TIMEOUT)
+        if response.status_code >= 400:
+            return {'error': f'custom endpoint returned HTTP {response.status_code}: {response.text[:500]}'}
+        data = orjson.loads(response.content)
         return {'summary': data.get('summary', ''), 'full': str(data)}
 
     return {'error': 'Unknown provider'}
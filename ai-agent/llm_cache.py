@@ -0,0 +1,37 @@
+import os
+import json
+import hashlib
+from diskcache import Cache
+
+CACHE_DIR = os.path.expanduser(os.getenv('GENOPS_LLM_CACHE_DIR', '~/.cache/genops_llm'))
+CACHE_TTL = 24 * 60 * 60
+CACHE_SIZE_LIMIT = 256 * 1024 * 1024
+
+_cache = None
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = Cache(CACHE_DIR, size_limit=CACHE_SIZE_LIMIT, eviction_policy='least-recently-used')
+    return _cache
+
+def cache_key(model, prompt, temperature):
+    payload = json.dumps({'model': model, 'prompt': prompt, 'temperature': temperature}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def cached_call(model, prompt, temperature, fn):
+    # Only deterministic (temperature 0) completions are safe to replay
+    if temperature > 0:
+        return fn()
+
+    cache = get_cache()
+    key = cache_key(model, prompt, temperature)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+
+    value = fn()
+    # Never pin a failed call for the whole TTL
+    if value is not None and not (isinstance(value, dict) and 'error' in value):
+        cache.set(key, value, expire=CACHE_TTL)
+    return value
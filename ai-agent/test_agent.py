@@ -0,0 +1,115 @@
+import os, subprocess
+import orjson
+import pytest
+from agent import ANALYSIS_CACHE_DIR, DIFF_TRUNCATED_MARKER, compact_results, is_trivial_diff, prune_analysis_cache, read_git_diff
+
+def git(repo, *args):
+    subprocess.run(["git", "-C", str(repo), "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                   check=True, capture_output=True)
+
+def write(repo, name, data):
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with open(os.path.join(repo, name), mode) as f:
+        f.write(data)
+
+@pytest.fixture
+def repo(tmp_path):
+    # HEAD~5 needs six commits; the change under test lands in the last one
+    git(tmp_path, "init", "-q")
+    write(tmp_path, "app.py", "def handle(user, req):\n    if user.is_admin:\n        grant(req)\n    log(req)\n")
+    write(tmp_path, "view.py", "def view(req):\n    check_auth(req)\n    return do_sensitive(req)\n")
+    write(tmp_path, "pod.yaml", "spec:\n  securityContext:\n    runAsNonRoot: true\n    privileged: false\n")
+    write(tmp_path, "tool.jar", b"\x00PK\x03\x04v1")
+    write(tmp_path, "deploy.sh", "echo deploy\n")
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "commit", "-q", "-m", "base")
+    for i in range(4):
+        git(tmp_path, "commit", "-q", "--allow-empty", "-m", f"empty {i}")
+    return tmp_path
+
+def commit_diff(repo):
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "--allow-empty", "-m", "change")
+    return read_git_diff(str(repo))
+
+def test_no_changes_is_trivial(repo):
+    assert is_trivial_diff(commit_diff(repo))
+
+def test_dedent_out_of_guard_is_not_trivial(repo):
+    write(repo, "app.py", "def handle(user, req):\n    if user.is_admin:\n        pass\n    grant(req)\n    log(req)\n")
+    assert not is_trivial_diff(commit_diff(repo))
+
+def test_reordered_lines_are_not_trivial(repo):
+    write(repo, "view.py", "def view(req):\n    return do_sensitive(req)\n    check_auth(req)\n")
+    assert not is_trivial_diff(commit_diff(repo))
+
+def test_moved_yaml_key_is_not_trivial(repo):
+    write(repo, "pod.yaml", "spec:\n  privileged: false\n  securityContext:\n    runAsNonRoot: true\n")
+    assert not is_trivial_diff(commit_diff(repo))
+
+def test_binary_and_mode_changes_are_not_trivial(repo):
+    write(repo, "tool.jar", b"\x00PK\x03\x04v2")
+    os.chmod(os.path.join(repo, "deploy.sh"), 0o755)
+    assert not is_trivial_diff(commit_diff(repo))
+
+def test_mode_only_change_is_not_trivial(repo):
+    os.chmod(os.path.join(repo, "deploy.sh"), 0o755)
+    assert not is_trivial_diff(commit_diff(repo))
+
+def test_rename_is_not_trivial(repo):
+    git(repo, "mv", "deploy.sh", "deploy-prod.sh")
+    assert not is_trivial_diff(commit_diff(repo))
+
+def test_truncated_diff_is_not_trivial():
+    assert not is_trivial_diff(f"diff --git a/x b/x{DIFF_TRUNCATED_MARKER}")
+
+def compact_report(tmp_path, tool, report):
+    write(tmp_path, f"{tool}.stdout", orjson.dumps(report, option=orjson.OPT_SORT_KEYS))
+    write(tmp_path, f"{tool}.stderr", b"")
+    result = {"returncode": 1, "stdout_path": str(tmp_path / f"{tool}.stdout"),
+              "stderr_path": str(tmp_path / f"{tool}.stderr")}
+    return compact_results({tool: result})[tool]
+
+def test_bandit_findings_survive_metrics(tmp_path):
+    report = {
+        "errors": [], "generated_at": "2024-01-01T00:00:00Z",
+        "metrics": {f"./f{i}.py": {"loc": i, "nosec": 0, "SEVERITY.HIGH": 0} for i in range(100)},
+        "results": [{"code": "2 os.system(input())\n", "filename": "./a.py", "issue_text": "os.system call",
+                     "line_number": 2, "more_info": "https://example.com", "test_id": "B605"}],
+    }
+    entry = compact_report(tmp_path, "bandit", report)
+    assert entry["finding_count"] == 1
+    assert orjson.loads(entry["findings"]) == [{"filename": "./a.py", "issue_text": "os.system call", "line_number": 2, "test_id": "B605"}]
+
+def test_eslint_counts_messages_not_files(tmp_path):
+    report = [
+        {"filePath": f"/src/{name}.js", "messages": [{"ruleId": "no-eval", "line": i, "fix": {"text": "x"}} for i in range(50)]}
+        for name in ("a", "b")
+    ]
+    assert compact_report(tmp_path, "javascript", report)["finding_count"] == 100
+
+def test_trivy_nested_bulky_fields_are_dropped(tmp_path):
+    misconfig = {
+        "ID": "DS002", "Severity": "HIGH", "Message": "Specify at least 1 USER command",
+        "Description": "x" * 500, "References": ["https://example.com"] * 5,
+        "CauseMetadata": {"StartLine": 1, "Code": {"Lines": [{"Content": "FROM alpine"}] * 20}},
+    }
+    entry = compact_report(tmp_path, "trivy", {"Results": [{"Target": "Dockerfile", "Misconfigurations": [misconfig] * 3}]})
+    assert entry["finding_count"] == 3
+    assert orjson.loads(entry["findings"])[0] == {"Target": "Dockerfile", "ID": "DS002", "Severity": "HIGH",
+                           "Message": "Specify at least 1 USER command", "CauseMetadata": {"StartLine": 1}}
+
+def test_checkov_code_block_is_dropped(tmp_path):
+    check = {"check_id": "CKV_AWS_20", "file_path": "/main.tf", "code_block": [[1, 'resource "aws_s3_bucket" "b" {']] * 40}
+    entry = compact_report(tmp_path, "checkov", {"results": {"failed_checks": [check]}})
+    assert entry["finding_count"] == 1
+    assert orjson.loads(entry["findings"]) == [{"check_id": "CKV_AWS_20", "file_path": "/main.tf"}]
+
+def test_prune_keeps_every_entry_for_head(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    head, old = "a" * 40, "b" * 40
+    names = [f"{head}-semgrep", f"{head}-nosemgrep", f"{head}-semgrep.tmp123", f"{old}-semgrep", f"{old}-nosemgrep.tmp9"]
+    for name in names:
+        os.makedirs(os.path.join(ANALYSIS_CACHE_DIR, name))
+    prune_analysis_cache(head)
+    assert sorted(os.listdir(ANALYSIS_CACHE_DIR)) == sorted(names[:3])
@@ -0,0 +1,20 @@
+from analyzers import analyzer_failed
+
+def result(tmp_path, returncode, stdout=b""):
+    stdout_path = tmp_path / "tool.stdout"
+    stdout_path.write_bytes(stdout)
+    return {"returncode": returncode, "stdout_path": str(stdout_path)}
+
+def test_findings_exit_codes_are_not_failures(tmp_path):
+    assert not analyzer_failed("bandit", result(tmp_path, 1))
+    assert not analyzer_failed("pmd", result(tmp_path, 4))
+    assert not analyzer_failed("roslyn", result(tmp_path, 1))
+
+def test_other_exit_codes_are_failures(tmp_path):
+    assert analyzer_failed("semgrep", result(tmp_path, 2))
+    assert analyzer_failed("trivy", result(tmp_path, 1))
+    assert analyzer_failed("bandit", {"error": "No such file or directory: 'bandit'"})
+
+def test_checkstyle_exit_code_is_its_error_count(tmp_path):
+    assert not analyzer_failed("checkstyle", result(tmp_path, 37, b"Starting audit...\nAudit done.\n"))
+    assert analyzer_failed("checkstyle", result(tmp_path, 254))